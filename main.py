@@ -2,6 +2,7 @@ from src import db, parsers, categorizer, sheets
 from src.config import LOG_PATH
 import logging
 import sys
+import torch
 
 
 def setup_logging():
@@ -16,6 +17,9 @@ def setup_logging():
 
 
 def main():
+    # nothing here trains a model, skip autograd bookkeeping everywhere
+    torch.set_grad_enabled(False)
+
     # read config
     config = parsers.read_config()
 
@@ -1,14 +1,65 @@
+import os
+import hashlib
 import torch
 import logging
+import numpy as np
 from dataclasses import dataclass
 import re
+from typing import get_args
 import pandas as pd
 from rapidfuzz import process, fuzz
-from sentence_transformers import SentenceTransformer, util
-from src.config import MODEL_NAME, MODEL_CACHE
+from sentence_transformers import (
+    SentenceTransformer,
+    export_dynamic_quantized_onnx_model,
+)
+from src.config import (
+    MODEL_NAME,
+    MODEL_CACHE,
+    MODEL_BACKEND,
+    PRELOAD_MODEL,
+    ModelBackend,
+)
 
 logger = logging.getLogger(__name__)
 
+# Encoding small batches gains little beyond a handful of intra-op threads
+torch.set_num_threads(min(8, os.cpu_count() or 1))
+
+
+def select_device() -> str:
+    """Returns the fastest available torch device: cuda, mps or cpu."""
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+ONNX_INT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+def load_onnx_int8_model(model_name: str, cache_folder: str) -> SentenceTransformer:
+    """
+    Loads an INT8 dynamically quantized ONNX export of the model for CPU inference.
+    The export and quantization run once and are stored under cache_folder/onnx_int8.
+    """
+    onnx_dir = os.path.join(cache_folder, "onnx_int8", model_name.replace("/", "__"))
+
+    if not os.path.exists(os.path.join(onnx_dir, ONNX_INT8_FILE)):
+        logger.info(f"Exporting '{model_name}' to ONNX with INT8 quantization...")
+        model = SentenceTransformer(
+            model_name, cache_folder=cache_folder, backend="onnx", device="cpu"
+        )
+        model.save(onnx_dir)
+        export_dynamic_quantized_onnx_model(model, "avx512_vnni", onnx_dir)
+
+    return SentenceTransformer(
+        onnx_dir,
+        backend="onnx",
+        device="cpu",
+        model_kwargs={"file_name": ONNX_INT8_FILE},
+    )
+
 
 @dataclass
 class CategoryData:
@@ -52,23 +103,32 @@ class SmartCategorizer:
         categories: list[CategoryData],
         model_name: str = MODEL_NAME,
         cache_folder: str = MODEL_CACHE,
+        use_fp16: bool = True,
+        backend: ModelBackend = MODEL_BACKEND,
     ):
         """
         Initializes the categorizer with a list of CategoryData.
+        Set use_fp16=False to keep full precision on CUDA for reproducible scores.
+        backend="onnx" runs an INT8 quantized ONNX Runtime model on the CPU.
         """
-        logger.info(
-            f"Loading categorization model '{model_name}'... (this may take a moment)"
-        )
-
-        # This will download the model to cache_folder only on the first run
-        self.model = SentenceTransformer(model_name, cache_folder=cache_folder)
-
         if not categories:
             raise ValueError("No categories provided to SmartCategorizer!")
+        if backend not in get_args(ModelBackend):
+            raise ValueError(
+                f"Unknown model backend '{backend}', "
+                f"expected one of {get_args(ModelBackend)}"
+            )
+
+        self.model_name = model_name
+        self.cache_folder = cache_folder
+        self.backend = backend
+        self.device = "cpu" if backend == "onnx" else select_device()
+        self.half_precision = use_fp16 and self.device == "cuda"
+        self._model: SentenceTransformer | None = None
 
         self.categories = categories
 
-        # Pre-compute the embeddings for the categories once
+        # Aligned with the rows of category_embeddings, which are encoded lazily
         self.category_names = [cat.name for cat in categories]
         self.category_descriptions = [cat.description for cat in categories]
 
@@ -82,32 +142,156 @@ class SmartCategorizer:
                 self.keyword_to_category[kw_lower] = cat.name
                 self.all_keywords.append(kw_lower)
 
-        # Batch encode all descriptions
-        self.category_embeddings = self.model.encode(
-            self.category_descriptions, convert_to_tensor=True
+        # Category of each keyword, aligned with all_keywords for batch lookups
+        self.keyword_categories = np.array(
+            [self.keyword_to_category[kw] for kw in self.all_keywords], dtype=object
+        )
+
+        # Config order of each keyword. When a description contains several
+        # keywords the one listed first wins, as with fuzzy matching.
+        self.keyword_rank: dict[str, int] = {}
+        for idx, kw in enumerate(self.all_keywords):
+            self.keyword_rank.setdefault(kw, idx)
+
+        # One alternation over all keywords for the exact substring pre-filter,
+        # captured so pandas can extract the matched keywords. The lookahead
+        # finds a match at every position, so keywords overlapping an earlier
+        # hit are seen too.
+        keyword_alternatives = [re.escape(kw) for kw in self.all_keywords if kw]
+        self.keyword_pattern = (
+            re.compile(f"(?=({'|'.join(keyword_alternatives)}))")
+            if keyword_alternatives
+            else None
         )
 
+        # The model and embeddings are only needed when fuzzy matching misses
+        self._category_embeddings: torch.Tensor | None = None
+        if PRELOAD_MODEL:
+            self.preload()
+
+    @property
+    def model(self) -> SentenceTransformer:
+        """Loads the SentenceTransformer on first access."""
+        if self._model is None:
+            logger.info(
+                f"Loading categorization model '{self.model_name}'... (this may take a moment)"
+            )
+            if self.backend == "onnx":
+                self._model = load_onnx_int8_model(self.model_name, self.cache_folder)
+            else:
+                # This will download the model to cache_folder only on the first run
+                self._model = SentenceTransformer(
+                    self.model_name, cache_folder=self.cache_folder, device=self.device
+                )
+                if self.half_precision:
+                    self._model.half()
+            # Inference only, disables dropout
+            self._model.eval()
+        return self._model
+
+    @property
+    def category_embeddings(self) -> torch.Tensor:
+        """Category description embeddings, computed on first access."""
+        if self._category_embeddings is None:
+            self._category_embeddings = self._load_category_embeddings()
+        return self._category_embeddings
+
+    def preload(self) -> None:
+        """Loads the model and category embeddings now instead of on first use."""
+        _ = self.model, self.category_embeddings
+
+    def _load_category_embeddings(self) -> torch.Tensor:
+        """
+        Returns the category description embeddings, reading them from the
+        on-disk cache when the model and descriptions are unchanged.
+        """
+        key = hashlib.sha1(
+            (
+                "|".join(self.category_descriptions) + self.model_name + self.backend
+            ).encode()
+        ).hexdigest()
+        cache_path = os.path.join(self.cache_folder, f"cat_emb_{key}.pt")
+
+        embeddings = None
+        if os.path.exists(cache_path):
+            logger.info("Loading cached category embeddings.")
+            try:
+                embeddings = torch.load(cache_path, map_location="cpu")
+            except Exception as e:
+                logger.warning(
+                    f"Could not read category embeddings cache {cache_path}: {e}. "
+                    "Re-encoding."
+                )
+
+        if embeddings is None:
+            # Batch encode all descriptions
+            with torch.inference_mode():
+                embeddings = self.model.encode(
+                    self.category_descriptions, convert_to_tensor=True
+                )
+            # Always cache full precision on CPU so the file works on any device.
+            # Written aside and moved into place, so an interrupted save never
+            # leaves a truncated cache behind.
+            os.makedirs(self.cache_folder, exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            torch.save(embeddings.float().cpu(), tmp_path)
+            os.replace(tmp_path, cache_path)
+
+        # Unit length once here, so scoring is a plain matrix product
+        embeddings = torch.nn.functional.normalize(embeddings.to(self.device), dim=1)
+        return embeddings.half() if self.half_precision else embeddings
+
+    def predict_keyword_batch(self, descriptions: list[str]) -> list[str | None]:
+        """
+        Matches all descriptions against the keywords verbatim (case-insensitive)
+        in one regex pass. Returns the category of the first keyword in config
+        order contained in each description, or None where none is.
+        """
+        categories: list[str | None] = [None] * len(descriptions)
+        if self.keyword_pattern is None or not descriptions:
+            return categories
+
+        matched_keywords = (
+            pd.Series(descriptions, dtype=object)
+            .str.lower()
+            .str.extractall(self.keyword_pattern)[0]
+        )
+        # The keyword listed first wins per description
+        first_ranks = matched_keywords.map(self.keyword_rank).groupby(level=0).min()
+        for i, rank in first_ranks.items():
+            categories[i] = self.keyword_categories[rank]
+        return categories
+
     def find_fuzzy_match(self, description: str, threshold: float = 90.0) -> str | None:
         """
         Tries to find a fuzzy match for the description in the keywords.
         """
-        if not self.all_keywords:
-            return None
+        return self.predict_fuzzy_batch([description], threshold=threshold)[0]
 
-        cleaned_description = description.lower()
+    def predict_fuzzy_batch(
+        self, descriptions: list[str], threshold: float = 90.0
+    ) -> list[str | None]:
+        """
+        Fuzzy matches all descriptions against the keywords in a single
+        many-to-many call. Returns None where no keyword reaches the threshold.
+        """
+        if not self.all_keywords:
+            return [None] * len(descriptions)
 
-        result = process.extractOne(
-            cleaned_description,
+        scores = process.cdist(
+            [d.lower() for d in descriptions],
             self.all_keywords,
             scorer=fuzz.partial_ratio,
             score_cutoff=threshold,
+            workers=-1,
         )
+        best = scores.argmax(axis=1)
+        matched = scores[np.arange(len(descriptions)), best] >= threshold
 
-        if result:
-            matched_kw, score, index = result
-            return self.keyword_to_category[matched_kw]
-
-        return None
+        return [
+            self.keyword_categories[idx] if hit else None
+            for idx, hit in zip(best, matched)
+        ]
 
     def predict_batch(
         self,
@@ -117,7 +301,7 @@ class SmartCategorizer:
     ) -> list[str]:
         """
         Predicts categories for a list of descriptions.
-        Tries fuzzy matching first, then falls back to the model.
+        Tries exact keyword matches, then fuzzy matching, then falls back to the model.
         """
         if not descriptions:
             return []
@@ -129,29 +313,45 @@ class SmartCategorizer:
         # Clean descriptions once for both fuzzy and model matching
         cleaned_descriptions = [d.strip() for d in descriptions]
 
-        # 1. Try fuzzy matching first
-        for i, desc in enumerate(cleaned_descriptions):
-            fuzzy_cat = self.find_fuzzy_match(desc, threshold=fuzzy_threshold)
-            if fuzzy_cat:
-                results[i] = fuzzy_cat
+        # 1. Exact keyword matches in one regex pass over all descriptions,
+        # fuzzy matching only for descriptions without one
+        keyword_cats = self.predict_keyword_batch(cleaned_descriptions)
+        fuzzy_indices = [i for i, cat in enumerate(keyword_cats) if cat is None]
+        fuzzy_cats = self.predict_fuzzy_batch(
+            [cleaned_descriptions[i] for i in fuzzy_indices], threshold=fuzzy_threshold
+        )
+        for i, fuzzy_cat in zip(fuzzy_indices, fuzzy_cats):
+            keyword_cats[i] = fuzzy_cat
+
+        for i, (desc, keyword_cat) in enumerate(
+            zip(cleaned_descriptions, keyword_cats)
+        ):
+            if keyword_cat:
+                results[i] = keyword_cat
             else:
                 remaining_indices.append(i)
                 remaining_descriptions.append(desc)
 
         # 2. Model fallback for remaining
         if remaining_descriptions:
-            desc_embeddings = self.model.encode(
-                remaining_descriptions, convert_to_tensor=True
-            )
-            cosine_scores = util.cos_sim(desc_embeddings, self.category_embeddings)
-
-            for i, res_idx in enumerate(remaining_indices):
-                scores = cosine_scores[i]
-                best_score_idx = torch.argmax(scores).item()
-                best_score = scores[best_score_idx].item()
-
+            # encode() sorts by length internally, so padding stays minimal per batch
+            with torch.inference_mode():
+                desc_embeddings = self.model.encode(
+                    remaining_descriptions,
+                    convert_to_tensor=True,
+                    batch_size=64,
+                    show_progress_bar=False,
+                    normalize_embeddings=True,
+                )
+            # Both sides are unit length, so the dot product is the cosine similarity
+            cosine_scores = desc_embeddings @ self.category_embeddings.T
+            best_scores, best_indices = cosine_scores.max(dim=1)
+
+            for res_idx, best_score, best_idx in zip(
+                remaining_indices, best_scores.tolist(), best_indices.tolist()
+            ):
                 if best_score > threshold:
-                    results[res_idx] = self.category_names[best_score_idx]
+                    results[res_idx] = self.category_names[best_idx]
                 else:
                     results[res_idx] = "Unknown"
 
@@ -178,11 +378,13 @@ class SmartCategorizer:
             + " "
             + df["note"].fillna("")
             + " amount="
-            + (df["amount"].astype(str))
+            + (df["amount"] / 100).map("{:.2f}".format)
         ).tolist()
 
-        # Batch prediction
-        df["category"] = self.predict_batch(search_strings)
+        # Batch prediction on unique strings only, recurring merchants repeat a lot
+        unique_strings, inverse = np.unique(search_strings, return_inverse=True)
+        categories = self.predict_batch(unique_strings.tolist())
+        df["category"] = np.asarray(categories, dtype=object)[inverse]
 
         return df
 
@@ -214,7 +416,7 @@ if __name__ == "__main__":
                     "Bolt ride",
                 ],
                 "note": ["Salary", "Groceries", "Taxi"],
-                "amount": [3000.0, -15.50, -5.00],
+                "amount": [300000, -1550, -500],
                 "date": ["2023-11-01", "2023-11-02", "2023-11-03"],
             }
         )
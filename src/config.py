@@ -1,7 +1,11 @@
 # src/config.py
 import os
+from typing import Literal
 from pydantic_settings import BaseSettings
 
+# "onnx" runs an INT8 quantized model with ONNX Runtime, CPU only
+ModelBackend = Literal["torch", "onnx"]
+
 
 class Settings(BaseSettings):
     db_folder: str = "database"
@@ -14,6 +18,8 @@ class Settings(BaseSettings):
 
     model_name: str = "all-MiniLM-L6-v2"
     model_cache: str = "model_cache"
+    model_backend: ModelBackend = "torch"
+    preload_model: bool = False
 
     debug_mode: bool = False
     pythonpath: str = "."
@@ -37,5 +43,8 @@ LOG_PATH = settings.log_path
 INPUT_FOLDER = settings.input_folder
 MODEL_NAME = settings.model_name
 MODEL_CACHE = settings.model_cache
+MODEL_BACKEND = settings.model_backend
+PRELOAD_MODEL = settings.preload_model
 GOOGLE_SERVICE_ACCOUNT = settings.google_service_account
 CONFIG_FILE = settings.config_file
+DEBUG_MODE = settings.debug_mode
@@ -1,3 +1,5 @@
+import functools
+import itertools
 import logging
 import sqlite3
 import pandas as pd
@@ -6,19 +8,40 @@ from src.config import DB_PATH
 logger = logging.getLogger(__name__)
 
 
-def get_connection() -> sqlite3.Connection:
-    """Returns a connection with foreign keys enabled."""
-    conn = sqlite3.connect(DB_PATH)
+@functools.lru_cache(maxsize=1)
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Opens and tunes the connection shared by the module for db_path."""
+    # Autocommit, transactions are opened explicitly where they matter. Values are
+    # bound as plain types, so no declared-type converters. The connection is
+    # shared, allow other threads when SQLite itself serializes access.
+    conn = sqlite3.connect(
+        db_path,
+        isolation_level=None,
+        detect_types=0,
+        check_same_thread=sqlite3.threadsafety != 3,
+    )
     # Crucial: SQLite does not enforce Foreign Keys by default!
     conn.execute("PRAGMA foreign_keys = ON;")
+    # WAL with NORMAL sync is durable enough here and avoids an fsync per commit
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    conn.execute("PRAGMA cache_size = -65536;")  # 64 MB
+    conn.execute("PRAGMA mmap_size = 268435456;")  # 256 MB
     return conn
 
 
+def get_connection() -> sqlite3.Connection:
+    """Returns the shared connection with foreign keys enabled."""
+    return _connect(DB_PATH)
+
+
 def get_all_categories() -> list[dict]:
     """Returns all categories as a list of dictionaries."""
     with get_connection() as conn:
-        conn.row_factory = sqlite3.Row
         c = conn.cursor()
+        # Set on the cursor only, the connection is shared
+        c.row_factory = sqlite3.Row
         c.execute("SELECT * FROM categories")
         rows = c.fetchall()
         return [dict(row) for row in rows]
@@ -65,45 +88,64 @@ def load_data(bank: str, data: pd.DataFrame) -> None:
         c.execute("SELECT id, name FROM categories")
         category_map = {name: cid for cid, name in c.fetchall()}
 
-        # Prepare records for insertion
-        records = []
-        for _, row in data.iterrows():
-            category_name = row.get("category", "Unknown")
-            category_id = category_map.get(category_name)
-
-            if category_id is None:
-                logger.warning(
-                    f"Category '{category_name}' not found. Using 'Unknown'."
-                )
-                category_id = category_map.get("Unknown")
-
-            # Convert amount to cents (integer)
-            amount_cents = int(row["amount"] * 100)
-
-            records.append(
-                (
-                    row["hash_id"],
-                    row["date"],
-                    amount_cents,
-                    row["description"],
-                    account_id,
-                    category_id,
-                    row["note"],
-                )
+        # Map category names to IDs, falling back to 'Unknown'
+        if "category" in data.columns:
+            category_names = data["category"]
+        else:
+            category_names = pd.Series("Unknown", index=data.index)
+        category_ids = category_names.map(category_map).astype("Int64")
+
+        missing = category_ids.isna()
+        if missing.any():
+            logger.warning(
+                f"{missing.sum()} transactions have unknown categories "
+                f"{sorted(category_names[missing].astype(str).unique())}. Using 'Unknown'."
             )
-
-        # Batched insert for performance
-        c.executemany(
-            """
-            INSERT OR IGNORE INTO transactions (
-                hash_id, date, amount, description, account_id, category_id, note
+            category_ids = category_ids.fillna(category_map.get("Unknown", pd.NA))
+        # Plain Python ints and None for sqlite3 parameter binding
+        category_ids = category_ids.astype(object).where(category_ids.notna(), None)
+
+        # Amounts are already integer cents
+        records = list(
+            zip(
+                data["hash_id"],
+                data["date"],
+                data["amount"].astype("int64"),
+                data["description"],
+                itertools.repeat(account_id),
+                category_ids,
+                data["note"],
             )
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            records,
         )
 
-        logger.info(f"Successfully processed {len(records)} transactions for {bank}.")
+        # The account and category IDs were just read above, so skip the per-row
+        # foreign key lookups. The pragma only takes effect outside a transaction.
+        conn.execute("PRAGMA foreign_keys = OFF;")
+        try:
+            # Batched insert for performance, in a single transaction
+            c.execute("BEGIN")
+            c.executemany(
+                """
+                INSERT OR IGNORE INTO transactions (
+                    hash_id, date, amount, description, account_id, category_id, note
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                records,
+            )
+            inserted = c.rowcount
+            conn.commit()
+        except Exception:
+            # Close the transaction first, or re-enabling would be a no-op
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON;")
+
+        logger.info(
+            f"Successfully processed {len(records)} transactions for {bank} "
+            f"({inserted} new)."
+        )
 
 
 def _seed_default_data(c: sqlite3.Cursor, config: dict) -> None:
@@ -153,6 +195,7 @@ def initialize_database(config: dict) -> None:
     """Creates tables and seeds default data."""
     with get_connection() as conn:
         c = conn.cursor()
+        c.execute("BEGIN")
 
         # 1. Accounts Table
         c.execute("""
@@ -188,6 +231,13 @@ def initialize_database(config: dict) -> None:
                 FOREIGN KEY(category_id) REFERENCES categories(id)
             )
         """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions(date DESC)")
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tx_account ON transactions(account_id)"
+        )
+        c.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tx_category ON transactions(category_id)"
+        )
 
         _seed_default_data(c, config)
 
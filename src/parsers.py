@@ -1,15 +1,23 @@
-from src.schemas import TransactionSchema
+from src.schemas import validate_transactions
 import hashlib
-import sqlite3
+import json
+import os
+import re
 import yaml
 import logging
+import multiprocessing
+import numpy as np
 import pandas as pd
-from decimal import Decimal
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from src.config import DB_PATH, INPUT_FOLDER, CONFIG_FILE
+from src.config import INPUT_FOLDER, CONFIG_FILE
+from src.db import get_connection
 
 logger = logging.getLogger(__name__)
 
+# Remembers detected bank types by file size and mtime, kept in the input folder
+BANK_CACHE_FILE = ".bank_cache.json"
+
 
 def read_config() -> dict:
     config_path = Path(CONFIG_FILE)
@@ -21,15 +29,20 @@ def read_config() -> dict:
     return config
 
 
-def identify_bank_type(file_path: Path) -> str:
+# Bank name in the file name, e.g. "n26_2023.csv" or "SEB-statement.csv"
+_BANK_RE = re.compile(r"(?<![a-z])(n26|seb|revolut)(?![a-z])", re.IGNORECASE)
+
+# The headers used for detection are all within the first lines of a statement
+_SNIFF_CHARS = 1024
+
+
+def _sniff_bank_type(file_path: Path) -> str:
     """
     Identifies the bank type for a file based on its content headers.
     """
     try:
         with file_path.open("r", encoding="utf-8") as f:
-            # Read first few lines for better identification
-            lines = [f.readline() for _ in range(5)]
-            content = "".join(lines)
+            content = f.read(_SNIFF_CHARS)
 
             if '"Booking Date"' in content and '"Value Date"' in content:
                 return "n26"
@@ -45,6 +58,68 @@ def identify_bank_type(file_path: Path) -> str:
     return "unknown"
 
 
+def _bank_type_from_name(file_path: Path) -> str | None:
+    """Returns the bank named in the file name, if any."""
+    match = _BANK_RE.search(file_path.name)
+    return match.group(1).lower() if match else None
+
+
+def identify_bank_type(file_path: Path) -> str:
+    """
+    Identifies the bank type by file name, reading the headers only when the
+    name does not mention a known bank.
+    """
+    return _bank_type_from_name(file_path) or _sniff_bank_type(file_path)
+
+
+def _read_bank_cache(cache_path: Path) -> dict[str, dict]:
+    """Reads the bank type cache, returning an empty cache if missing or corrupt."""
+    try:
+        with cache_path.open("r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _write_bank_cache(cache_path: Path, cache: dict[str, dict]) -> None:
+    try:
+        with cache_path.open("w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        logger.warning(f"Could not write bank type cache {cache_path}: {e}")
+
+
+def _identify_bank_type_cached(file_path: Path, cache: dict[str, dict]) -> str:
+    """
+    Identifies the bank type from the file headers, skipping the file read if
+    the file's size and mtime match the cached entry. Updates the cache on a miss.
+    """
+    try:
+        stat = file_path.stat()
+    except OSError:
+        return _sniff_bank_type(file_path)
+
+    key = str(file_path)
+    entry = cache.get(key)
+    # Anything unexpected in a hand-edited cache is treated as a miss
+    if (
+        isinstance(entry, dict)
+        and entry.get("mtime_ns") == stat.st_mtime_ns
+        and entry.get("size") == stat.st_size
+        and isinstance(entry.get("bank_type"), str)
+    ):
+        return entry["bank_type"]
+
+    bank_type = _sniff_bank_type(file_path)
+    cache[key] = {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "bank_type": bank_type,
+    }
+    return bank_type
+
+
 def get_available_files(input_dir: str) -> dict[str, list[Path]]:
     """
     Scans the input directory and identifies the bank type for each file.
@@ -55,23 +130,70 @@ def get_available_files(input_dir: str) -> dict[str, list[Path]]:
         logger.warning(f"Input directory {input_dir} does not exist.")
         return {}
 
+    cache_path = input_path / BANK_CACHE_FILE
+    stored_cache = _read_bank_cache(cache_path)
+    cache = dict(stored_cache)
+    updated_cache = {}
+
+    # scandir yields names and file types without building a Path per entry
+    with os.scandir(input_path) as entries:
+        csv_files = [
+            Path(entry.path)
+            for entry in entries
+            if entry.name.endswith(".csv") and entry.is_file()
+        ]
+
     banks_files = {}
-    for file in input_path.glob("*.csv"):
-        bank_type = identify_bank_type(file)
+    for file in csv_files:
+        # The name is free to check, only files without a bank name are read,
+        # so only those go through the cache
+        bank_type = _bank_type_from_name(file)
+        if bank_type is None:
+            bank_type = _identify_bank_type_cached(file, cache)
+            if str(file) in cache:
+                updated_cache[str(file)] = cache[str(file)]
+
         if bank_type != "unknown":
             banks_files.setdefault(bank_type, []).append(file)
         else:
             logger.info(f"Skipping unknown file: {file}")
 
+    # Only rewrite the cache when entries were added, changed or removed
+    if updated_cache != stored_cache:
+        _write_bank_cache(cache_path, updated_cache)
+
     return banks_files
 
 
+def _to_cents(amount: pd.Series) -> pd.Series:
+    """Converts cleaned amount strings to integer cents."""
+    return (pd.to_numeric(amount) * 100).round().astype("int64")
+
+
 def generate_hash_id(row: pd.Series) -> str:
     """
     Generates a unique hash ID for a transaction row based on its date, amount, and description.
+    Use generate_hash_ids for whole DataFrames.
     """
-    raw_str = f"{row['date']}{row['amount']}{row['description']}"
-    return hashlib.md5(raw_str.encode()).hexdigest()
+    return generate_hash_ids(row.to_frame().T).iloc[0]
+
+
+def generate_hash_ids(df: pd.DataFrame, amounts: pd.Series | None = None) -> pd.Series:
+    """
+    Generates hash IDs for all rows at once from their date, amount, and description.
+    amounts overrides df["amount"]; parsers pass the decimal amount strings as
+    written in the statement, since hashing the parsed cents would change the
+    IDs of already imported rows.
+    """
+    if amounts is None:
+        amounts = df["amount"]
+
+    md5 = hashlib.md5  # Local name, skips the module attribute lookup per row
+    hash_ids = [
+        md5(f"{date}{amount}{description}".encode()).hexdigest()
+        for date, amount, description in zip(df["date"], amounts, df["description"])
+    ]
+    return pd.Series(hash_ids, index=df.index, dtype=str)
 
 
 def _normalize_df(df: pd.DataFrame, rename_map: dict, drop_cols: list) -> pd.DataFrame:
@@ -83,14 +205,17 @@ def _normalize_df(df: pd.DataFrame, rename_map: dict, drop_cols: list) -> pd.Dat
 
 def parse_n26_file(file_path: Path) -> pd.DataFrame:
     """Parses an N26 bank statement CSV file."""
-    df = pd.read_csv(file_path, sep=",", dtype={"Amount (EUR)": str})
-
     rename_map = {
         "Value Date": "date",
         "Amount (EUR)": "amount",
         "Partner Name": "description",
         "Payment Reference": "note",
     }
+    # Columns we keep are read as text, skipping type inference. Amounts must stay
+    # exactly as written since they feed the hash IDs; the pyarrow engine can't
+    # do this as it infers numbers first (-5.00 -> "-5.0").
+    df = pd.read_csv(file_path, sep=",", dtype=dict.fromkeys(rename_map, str))
+
     drop_cols = [
         "Booking Date",
         "Partner Iban",
@@ -102,87 +227,80 @@ def parse_n26_file(file_path: Path) -> pd.DataFrame:
     ]
 
     df = _normalize_df(df, rename_map, drop_cols)
-    df["amount"] = df["amount"].str.replace(",", "").apply(Decimal)
+    amounts = df["amount"].str.replace(",", "")
+    df["amount"] = _to_cents(amounts)
 
-    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
-    df["hash_id"] = df.apply(generate_hash_id, axis=1)
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", cache=True).dt.strftime(
+        "%Y-%m-%d"
+    )
+    df["hash_id"] = generate_hash_ids(df, amounts)
 
-    df = TransactionSchema.validate(df)
+    df = validate_transactions(df)
     return df
 
 
 def parse_seb_file(file_path: Path) -> pd.DataFrame:
     """Parses a SEB bank statement CSV file."""
-    df = pd.read_csv(
-        file_path,
-        sep=";",
-        skiprows=1,
-        decimal=",",
-        dtype={"SUMA SĄSKAITOS VALIUTA": str},
-    )
-
     rename_map = {
         "DATA": "date",
         "MOKĖTOJO ARBA GAVĖJO PAVADINIMAS": "description",
         "MOKĖJIMO PASKIRTIS": "note",
         "SUMA SĄSKAITOS VALIUTA": "amount",
     }
-    drop_cols = [
-        "DOK NR.",
-        "MOKĖTOJO ARBA GAVĖJO IDENTIFIKACINIS KODAS",
-        "SUMA",
-        "SĄSKAITA",
-        "DOKUMENTO DATA",
-        "TRANSAKCIJOS TIPAS",
-        "TRANSAKCIJOS KODAS",
-        "KREDITO ĮSTAIGOS SWIFT KODAS",
-        "KREDITO ĮSTAIGOS PAVADINIMAS",
-        "NUORODA",
-        "SĄSKAITOS NR",
-        "SĄSKAITOS VALIUTA",
-        "Unnamed: 18",
-    ]
+    usecols = [*rename_map, "VALIUTA", "DEBETAS/KREDITAS"]
+    df = pd.read_csv(
+        file_path,
+        sep=";",
+        skiprows=1,
+        usecols=usecols,
+        dtype=dict.fromkeys(usecols, str),
+    )
+    # One projection instead of dropping the other dozen columns
+    df = df[usecols].rename(columns=rename_map)
 
-    df = _normalize_df(df, rename_map, drop_cols)
-    df["amount"] = df["amount"].str.replace(",", ".").apply(Decimal)
-
-    if "VALIUTA" in df.columns:
-        df["note"] = df["note"].astype(str) + "; " + df["VALIUTA"].astype(str)
-        df = df.drop(columns=["VALIUTA"])
-
-    if "DEBETAS/KREDITAS" in df.columns:
-        df["amount"] = df.apply(
-            lambda row: -row["amount"]
-            if row["DEBETAS/KREDITAS"] == "D"
-            else row["amount"],
-            axis=1,
-        )
-        df = df.drop(columns=["DEBETAS/KREDITAS"])
+    amounts = df["amount"].str.replace(",", ".")
+    df["amount"] = _to_cents(amounts)
+
+    df["note"] = df["note"].astype(str) + "; " + df["VALIUTA"].astype(str)
+
+    is_debit = df["DEBETAS/KREDITAS"].eq("D")
+    df["amount"] = np.where(is_debit, -df["amount"], df["amount"])
+    amounts = amounts.mask(
+        is_debit, ("-" + amounts).str.replace(r"^--", "", regex=True)
+    )
+    df = df.drop(columns=["VALIUTA", "DEBETAS/KREDITAS"])
 
-    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
-    df["hash_id"] = df.apply(generate_hash_id, axis=1)
-    df = TransactionSchema.validate(df)
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d", cache=True).dt.strftime(
+        "%Y-%m-%d"
+    )
+    df["hash_id"] = generate_hash_ids(df, amounts)
+    df = validate_transactions(df)
     return df
 
 
 def parse_revolut_file(file_path: Path) -> pd.DataFrame:
     """Parses a Revolut bank statement CSV file."""
-    df = pd.read_csv(file_path, sep=",", dtype={"Amount": str})
-    df = df[df["State"] == "COMPLETED"].copy()
-
     rename_map = {
         "Completed Date": "date",
         "Description": "description",
         "Amount": "amount",
         "Currency": "note",
     }
-    drop_cols = ["Type", "Product", "Started Date", "Fee", "State", "Balance"]
-
-    df = _normalize_df(df, rename_map, drop_cols)
-    df["amount"] = df["amount"].str.replace(",", "").apply(Decimal)
-    df["date"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m-%d")
-    df["hash_id"] = df.apply(generate_hash_id, axis=1)
-    df = TransactionSchema.validate(df)
+    usecols = [*rename_map, "State"]
+    df = pd.read_csv(
+        file_path, sep=",", usecols=usecols, dtype=dict.fromkeys(usecols, str)
+    )
+    # Keep completed rows and the renamed columns in one step, before any work
+    df = df.loc[df["State"].eq("COMPLETED"), list(rename_map)].rename(
+        columns=rename_map
+    )
+    amounts = df["amount"].str.replace(",", "")
+    df["amount"] = _to_cents(amounts)
+    df["date"] = pd.to_datetime(
+        df["date"], format="%Y-%m-%d %H:%M:%S", cache=True
+    ).dt.strftime("%Y-%m-%d")
+    df["hash_id"] = generate_hash_ids(df, amounts)
+    df = validate_transactions(df)
     return df
 
 
@@ -191,40 +309,108 @@ def filter_our_present_data(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return df
 
-    with sqlite3.connect(DB_PATH) as conn:
+    # Look up only this batch's hashes instead of reading every stored hash_id
+    with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT hash_id FROM transactions")
+        cursor.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS batch_hashes (hash_id TEXT PRIMARY KEY)"
+        )
+        # One transaction, the connection would otherwise commit every insert
+        cursor.execute("BEGIN")
+        cursor.execute("DELETE FROM batch_hashes")
+        cursor.executemany(
+            "INSERT OR IGNORE INTO batch_hashes (hash_id) VALUES (?)",
+            ((h,) for h in df["hash_id"]),
+        )
+        cursor.execute("""
+            SELECT b.hash_id FROM batch_hashes b
+            JOIN transactions t ON t.hash_id = b.hash_id
+        """)
         existing_hash_ids = {row[0] for row in cursor.fetchall()}
+        conn.commit()
 
     return df[~df["hash_id"].isin(existing_hash_ids)].copy()
 
 
+PARSERS = {
+    "n26": parse_n26_file,
+    "seb": parse_seb_file,
+    "revolut": parse_revolut_file,
+}
+
+# Least total input, by start method, for which a worker pool pays off. Measured
+# with pandas 3.0 on CPython 3.12: the parsers read ~34 MB/s of N26 CSV
+# serially, and sending a parsed frame back costs ~7 ms per input MB. A fork
+# pool starts in ~15 ms, so two workers break even near 2 MB. Spawn and
+# forkserver pools take ~0.8 s to start even before main's torch import, which
+# moves break-even past 100 MB.
+PARALLEL_MIN_BYTES = {
+    "fork": 4 * 1024 * 1024,
+    "forkserver": 128 * 1024 * 1024,
+    "spawn": 128 * 1024 * 1024,
+}
+
+
+def _total_size(paths: list[Path]) -> int:
+    total = 0
+    for path in paths:
+        try:
+            total += path.stat().st_size
+        except OSError:
+            pass  # The parser will report the file
+    return total
+
+
+def _parse_files(
+    banks_files: dict[str, list[Path]],
+) -> dict[str, list[pd.DataFrame]]:
+    """
+    Parses the files of all banks, logging and skipping those that fail. Large
+    inputs are parsed in one pool of worker processes. Returns a mapping of
+    bank_type -> parsed frames.
+    """
+    tasks = [
+        (bank_type, path)
+        for bank_type, file_paths in banks_files.items()
+        if bank_type in PARSERS
+        for path in file_paths
+    ]
+    results: dict[str, list[pd.DataFrame]] = {}
+    max_workers = min(len(tasks), os.cpu_count() or 1)
+    min_bytes = PARALLEL_MIN_BYTES[multiprocessing.get_start_method()]
+    if max_workers <= 1 or _total_size([path for _, path in tasks]) < min_bytes:
+        for bank_type, path in tasks:
+            try:
+                df = PARSERS[bank_type](path)
+            except Exception as e:
+                logger.error(f"Failed to parse {path} as {bank_type}: {e}")
+            else:
+                results.setdefault(bank_type, []).append(df)
+        return results
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            (executor.submit(PARSERS[bank_type], path), bank_type, path)
+            for bank_type, path in tasks
+        ]
+        for future, bank_type, path in futures:
+            try:
+                df = future.result()
+            except Exception as e:
+                logger.error(f"Failed to parse {path} as {bank_type}: {e}")
+            else:
+                results.setdefault(bank_type, []).append(df)
+    return results
+
+
 def read_statement_files(config: dict) -> dict[str, pd.DataFrame]:
     """Reads, parses, and filters new transactions from all available files."""
     banks_files = get_available_files(INPUT_FOLDER)
 
-    parser_map = {
-        "n26": parse_n26_file,
-        "seb": parse_seb_file,
-        "revolut": parse_revolut_file,
-    }
-
     results = {}
-    for bank_type, file_paths in banks_files.items():
-        parse_func = parser_map.get(bank_type)
-        if not parse_func:
-            continue
-
-        dfs = []
-        for path in file_paths:
-            try:
-                dfs.append(parse_func(path))
-            except Exception as e:
-                logger.error(f"Failed to parse {path} as {bank_type}: {e}")
-
-        if dfs:
-            combined_df = pd.concat(dfs, ignore_index=True)
-            results[bank_type] = filter_our_present_data(combined_df)
+    for bank_type, dfs in _parse_files(banks_files).items():
+        combined_df = pd.concat(dfs, ignore_index=True)
+        results[bank_type] = filter_our_present_data(combined_df)
 
     return results
 
@@ -1,7 +1,7 @@
 import gspread
 import logging
-from gspread_dataframe import set_with_dataframe
 import pandas as pd
+from gspread.utils import ValueInputOption, rowcol_to_a1
 from src.config import GOOGLE_SERVICE_ACCOUNT
 import os
 
@@ -47,9 +47,25 @@ def upload_to_sheet(df: pd.DataFrame, sheet_name: str, tab_name: str = "Raw_Data
         worksheet.clear()
 
         df["amount"] = df["amount"] / 100.0
-        # UPLOAD new data
-        # set_with_dataframe handles headers and NaN values automatically
-        set_with_dataframe(worksheet, df, include_column_header=True)
+        n_rows, n_cols = df.shape
+
+        # Grow the grid if needed, a range update cannot write past its edges
+        if worksheet.row_count < n_rows + 1 or worksheet.col_count < n_cols:
+            worksheet.resize(
+                rows=max(worksheet.row_count, n_rows + 1),
+                cols=max(worksheet.col_count, n_cols),
+            )
+
+        # UPLOAD header and rows in a single request, NaN as empty cells.
+        # USER_ENTERED keeps dates parsed as dates, as before.
+        values = [df.columns.tolist()] + df.astype(object).where(
+            df.notna(), ""
+        ).values.tolist()
+        worksheet.update(
+            values,
+            f"A1:{rowcol_to_a1(n_rows + 1, n_cols)}",
+            value_input_option=ValueInputOption.user_entered,
+        )
 
         logger.info("Upload successful!")
 
@@ -1,11 +1,18 @@
+import pandas as pd
 import pytest
 import torch
 from unittest.mock import patch, MagicMock
-from src.categorizer import SmartCategorizer, CategoryData
+from src.categorizer import (
+    ONNX_INT8_FILE,
+    SmartCategorizer,
+    CategoryData,
+    load_onnx_int8_model,
+    select_device,
+)
 
 
 @pytest.fixture
-def mock_categorizer():
+def mock_categorizer(tmp_path):
     with patch("src.categorizer.SentenceTransformer") as mock_st:
         # Mock categories as CategoryData list
         categories = [
@@ -43,7 +50,11 @@ def mock_categorizer():
             ]
         )
 
-        categorizer = SmartCategorizer(categories=categories)
+        categorizer = SmartCategorizer(
+            categories=categories, cache_folder=str(tmp_path)
+        )
+        # Encode categories now, while encode still returns the category vectors
+        categorizer.preload()
         yield categorizer, mock_model
 
 
@@ -51,7 +62,7 @@ def test_predict_high_confidence(mock_categorizer):
     categorizer, mock_model = mock_categorizer
 
     # Mock encode for query to be similar to 'Food' [0, 1]
-    mock_model.encode.return_value = torch.tensor([0.1, 0.9])
+    mock_model.encode.return_value = torch.tensor([[0.1, 0.9]])
 
     category = categorizer.predict("Buying some bread")
     assert category == "Food"
@@ -61,7 +72,244 @@ def test_predict_low_confidence(mock_categorizer):
     categorizer, mock_model = mock_categorizer
 
     # Mock encode for query to be far from everything
-    mock_model.encode.return_value = torch.tensor([-1.0, -1.0])
+    mock_model.encode.return_value = torch.tensor([[-1.0, -1.0]])
 
     category = categorizer.predict("Something completely different", threshold=0.9)
     assert category == "Unknown"
+
+
+def test_category_embeddings_cached(mock_categorizer, tmp_path):
+    categorizer, mock_model = mock_categorizer
+    mock_model.encode.reset_mock()
+
+    # Same model and descriptions should be served from the on-disk cache
+    cached = SmartCategorizer(
+        categories=categorizer.categories, cache_folder=str(tmp_path)
+    )
+
+    assert torch.equal(cached.category_embeddings, categorizer.category_embeddings)
+    mock_model.encode.assert_not_called()
+
+
+def test_corrupt_category_embeddings_cache_is_rebuilt(mock_categorizer, tmp_path):
+    categorizer, mock_model = mock_categorizer
+    (cache_file,) = tmp_path.glob("cat_emb_*.pt")
+    cache_file.write_bytes(b"truncated")
+    mock_model.encode.reset_mock()
+
+    rebuilt = SmartCategorizer(
+        categories=categorizer.categories, cache_folder=str(tmp_path)
+    )
+
+    assert torch.equal(rebuilt.category_embeddings, categorizer.category_embeddings)
+    mock_model.encode.assert_called_once()
+    # The cache is overwritten with a readable file, no temp files are left
+    assert torch.load(cache_file).shape == (3, 2)
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_model_not_loaded_when_fuzzy_matches(tmp_path):
+    categories = [
+        CategoryData(
+            name="Food",
+            description="Groceries",
+            keywords=["Rimi"],
+            category_type="expense",
+        )
+    ]
+    with patch("src.categorizer.SentenceTransformer") as mock_st:
+        categorizer = SmartCategorizer(
+            categories=categories, cache_folder=str(tmp_path)
+        )
+
+        assert categorizer.predict("RIMI VILNIUS") == "Food"
+        mock_st.assert_not_called()
+
+
+def test_predict_keyword_batch(mock_categorizer):
+    categorizer, _ = mock_categorizer
+
+    results = categorizer.predict_keyword_batch(
+        ["RIMI VILNIUS", "BOLT.EU/O/123", "Taxis"]
+    )
+    assert results == ["Food", "Transport", None]
+    assert categorizer.predict_keyword_batch([]) == []
+
+
+def test_keyword_match_prefers_config_order(mock_categorizer):
+    categorizer, _ = mock_categorizer
+
+    # Food's keywords are listed before Transport's, wherever they appear
+    assert categorizer.predict_keyword_batch(["UBER RIMI"]) == ["Food"]
+    assert categorizer.predict_batch(["UBER RIMI", "BOLT PAYMENT"]) == [
+        "Food",
+        "Salary",
+    ]
+
+
+def test_predict_fuzzy_batch(mock_categorizer):
+    categorizer, _ = mock_categorizer
+
+    results = categorizer.predict_fuzzy_batch(["MAXIM", "ubr eats", "nothing here"])
+    assert results == ["Food", None, None]
+
+    # A lower cutoff lets the near miss through
+    assert categorizer.predict_fuzzy_batch(["ubr eats"], threshold=80.0) == [
+        "Transport"
+    ]
+
+
+def test_predict_batch_fuzzy_only_for_keyword_misses(mock_categorizer):
+    categorizer, _ = mock_categorizer
+
+    with patch.object(
+        categorizer, "predict_fuzzy_batch", return_value=["Food"]
+    ) as mock_fuzzy:
+        results = categorizer.predict_batch(["RIMI VILNIUS", " bolt.eu ", "MAXIM"])
+
+    assert results == ["Food", "Transport", "Food"]
+    mock_fuzzy.assert_called_once_with(["MAXIM"], threshold=90.0)
+
+
+def test_categorize_transactions_predicts_unique_strings_once(mock_categorizer):
+    categorizer, _ = mock_categorizer
+    df = pd.DataFrame(
+        {
+            "description": ["Rimi", "Bolt", "Rimi", None, "Bolt"],
+            "note": ["Food", None, "Food", "Salary", None],
+            "amount": [-1550, -500, -1550, 300000, -500],
+        },
+        index=[10, 3, 7, 1, 4],
+    )
+    by_string = {
+        "Rimi Food amount=-15.50": "Food",
+        "Bolt  amount=-5.00": "Transport",
+        " Salary amount=3000.00": "Salary",
+    }
+
+    with patch.object(
+        categorizer,
+        "predict_batch",
+        side_effect=lambda strings: [by_string[s] for s in strings],
+    ) as mock_predict:
+        result = categorizer.categorize_transactions(df)
+
+    (strings,) = mock_predict.call_args.args
+    assert sorted(strings) == sorted(by_string)
+    assert result["category"].to_dict() == {
+        10: "Food",
+        3: "Transport",
+        7: "Food",
+        1: "Salary",
+        4: "Transport",
+    }
+
+
+def _food_categories() -> list[CategoryData]:
+    return [
+        CategoryData(
+            name="Food",
+            description="Groceries",
+            keywords=["Rimi"],
+            category_type="expense",
+        )
+    ]
+
+
+def test_unknown_backend_rejected(tmp_path):
+    with pytest.raises(ValueError, match="ONNX"):
+        SmartCategorizer(
+            categories=_food_categories(), cache_folder=str(tmp_path), backend="ONNX"
+        )
+
+
+def test_select_device():
+    with (
+        patch("src.categorizer.torch.cuda.is_available", return_value=True),
+        patch("src.categorizer.torch.backends.mps.is_available", return_value=True),
+    ):
+        assert select_device() == "cuda"
+
+    with (
+        patch("src.categorizer.torch.cuda.is_available", return_value=False),
+        patch("src.categorizer.torch.backends.mps.is_available", return_value=True),
+    ):
+        assert select_device() == "mps"
+
+    with (
+        patch("src.categorizer.torch.cuda.is_available", return_value=False),
+        patch("src.categorizer.torch.backends.mps.is_available", return_value=False),
+    ):
+        assert select_device() == "cpu"
+
+
+@pytest.mark.parametrize(
+    "device, use_fp16, expect_half",
+    [("cuda", True, True), ("cuda", False, False), ("mps", True, False)],
+)
+def test_model_half_precision_only_on_cuda(tmp_path, device, use_fp16, expect_half):
+    with (
+        patch("src.categorizer.select_device", return_value=device),
+        patch("src.categorizer.SentenceTransformer") as mock_st,
+    ):
+        categorizer = SmartCategorizer(
+            categories=_food_categories(),
+            cache_folder=str(tmp_path),
+            use_fp16=use_fp16,
+        )
+        model = categorizer.model
+
+    mock_st.assert_called_once_with(
+        categorizer.model_name, cache_folder=str(tmp_path), device=device
+    )
+    assert model.half.called == expect_half
+    model.eval.assert_called_once()
+
+
+def test_onnx_backend_loads_int8_model_on_cpu(tmp_path):
+    with (
+        patch("src.categorizer.select_device") as mock_select,
+        patch("src.categorizer.load_onnx_int8_model") as mock_load,
+        patch("src.categorizer.SentenceTransformer") as mock_st,
+    ):
+        categorizer = SmartCategorizer(
+            categories=_food_categories(), cache_folder=str(tmp_path), backend="onnx"
+        )
+        model = categorizer.model
+
+    assert categorizer.device == "cpu"
+    assert not categorizer.half_precision
+    mock_select.assert_not_called()
+    mock_st.assert_not_called()
+    mock_load.assert_called_once_with(categorizer.model_name, str(tmp_path))
+    assert model is mock_load.return_value
+    model.half.assert_not_called()
+
+
+def test_load_onnx_int8_model_exports_once(tmp_path):
+    onnx_dir = tmp_path / "onnx_int8" / "org__model"
+
+    with (
+        patch("src.categorizer.SentenceTransformer") as mock_st,
+        patch("src.categorizer.export_dynamic_quantized_onnx_model") as mock_export,
+    ):
+        load_onnx_int8_model("org/model", str(tmp_path))
+
+        exported = mock_st.return_value
+        exported.save.assert_called_once_with(str(onnx_dir))
+        mock_export.assert_called_once_with(exported, "avx512_vnni", str(onnx_dir))
+
+        # Once the quantized file exists it is loaded directly
+        (onnx_dir / ONNX_INT8_FILE).parent.mkdir(parents=True)
+        (onnx_dir / ONNX_INT8_FILE).touch()
+        mock_st.reset_mock()
+        mock_export.reset_mock()
+        load_onnx_int8_model("org/model", str(tmp_path))
+
+    mock_export.assert_not_called()
+    mock_st.assert_called_once_with(
+        str(onnx_dir),
+        backend="onnx",
+        device="cpu",
+        model_kwargs={"file_name": ONNX_INT8_FILE},
+    )
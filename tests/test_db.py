@@ -1,4 +1,6 @@
+import logging
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 import pytest
 import pandas as pd
 from unittest.mock import patch
@@ -11,6 +13,8 @@ def mock_db_path(tmp_path):
     db_file = tmp_path / "test_finance.db"
     with patch("src.db.DB_PATH", str(db_file)):
         yield str(db_file)
+    # Drop the shared connection to the temporary database
+    db._connect.cache_clear()
 
 
 def test_initialize_database(mock_db_path):
@@ -35,6 +39,11 @@ def test_initialize_database(mock_db_path):
     assert "categories" in tables
     assert "transactions" in tables
 
+    # Check indexes
+    c.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    indexes = [row[0] for row in c.fetchall()]
+    assert {"idx_tx_date", "idx_tx_account", "idx_tx_category"} <= set(indexes)
+
     # Check seeded data
     c.execute("SELECT name FROM categories WHERE type='Income'")
     assert c.fetchone()[0] == "Salary"
@@ -45,6 +54,20 @@ def test_initialize_database(mock_db_path):
     conn.close()
 
 
+@pytest.mark.skipif(
+    sqlite3.threadsafety != 3, reason="SQLite is not built in serialized mode"
+)
+def test_shared_connection_across_threads(mock_db_path):
+    conn = db.get_connection()
+
+    def query_in_thread():
+        assert db.get_connection() is conn
+        return conn.execute("SELECT 1").fetchone()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(query_in_thread).result() == (1,)
+
+
 def test_get_all_categories(mock_db_path):
     config = {
         "categories": {
@@ -76,7 +99,7 @@ def test_load_data(mock_db_path):
         {
             "hash_id": ["abc123"],
             "date": ["2023-11-01"],
-            "amount": [10.50],  # Will be converted to int (1050)
+            "amount": [1050],  # Cents
             "description": ["Lunch"],
             "category": ["Food"],
             "note": ["Tasty"],
@@ -101,6 +124,82 @@ def test_load_data(mock_db_path):
     assert row[2] == account_id
     conn.close()
 
+    # Foreign keys are enforced again once the load is done
+    assert db.get_connection().execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+
+def test_load_data_multiple_rows(mock_db_path):
+    config = {
+        "categories": {
+            "income": {},
+            "expense": {"Food": {"description": "Groceries", "keywords": ["Food"]}},
+        },
+        "accounts": {"SEB": "Main account"},
+    }
+    db.initialize_database(config)
+
+    data = pd.DataFrame(
+        {
+            "hash_id": ["a", "b", "c"],
+            "date": ["2023-11-01", "2023-11-02", "2023-11-03"],
+            "amount": [-1050, 200000, -550],
+            "description": ["Lunch", "Salary", None],
+            "category": ["Food", "Salary", "Food"],  # 'Salary' is not seeded
+            "note": ["Tasty", None, "Coffee"],
+        }
+    )
+
+    db.load_data("SEB", data)
+
+    conn = sqlite3.connect(mock_db_path)
+    c = conn.cursor()
+    c.execute(
+        """
+        SELECT t.hash_id, t.amount, t.description, c.name
+        FROM transactions t JOIN categories c ON t.category_id = c.id
+        ORDER BY t.hash_id
+        """
+    )
+    assert c.fetchall() == [
+        ("a", -1050, "Lunch", "Food"),
+        ("b", 200000, "Salary", "Unknown"),
+        ("c", -550, None, "Food"),
+    ]
+    conn.close()
+
+
+def test_load_data_is_idempotent(mock_db_path, caplog):
+    config = {
+        "categories": {"income": {}, "expense": {}},
+        "accounts": {"SEB": "Main account"},
+    }
+    db.initialize_database(config)
+
+    data = pd.DataFrame(
+        {
+            "hash_id": ["a", "b"],
+            "date": ["2023-11-01", "2023-11-02"],
+            "amount": [-1050, -550],
+            "description": ["Lunch", "Coffee"],
+            "note": [None, None],
+        }
+    )
+
+    with caplog.at_level(logging.INFO, logger="src.db"):
+        db.load_data("SEB", data)
+        # Re-importing overlapping data is ignored by the hash_id primary key
+        db.load_data("SEB", pd.concat([data, data]))
+
+    messages = [r.getMessage() for r in caplog.records if r.name == "src.db"]
+    assert messages[-2].endswith("(2 new).")
+    assert messages[-1].endswith("(0 new).")
+
+    conn = sqlite3.connect(mock_db_path)
+    c = conn.cursor()
+    c.execute("SELECT count(*) FROM transactions")
+    assert c.fetchone()[0] == 2
+    conn.close()
+
 
 def test_load_data_invalid_account(mock_db_path):
     config = {"categories": {"income": {}, "expense": {}}, "accounts": {}}
@@ -1,8 +1,10 @@
+import hashlib
+import json
 import pandas as pd
 from decimal import Decimal
 from pathlib import Path
-from unittest.mock import patch
-from src import parsers
+from unittest.mock import MagicMock, patch
+from src import db, parsers
 
 
 def test_generate_hash_id():
@@ -17,31 +19,55 @@ def test_generate_hash_id():
     assert isinstance(hash_id, str)
     assert len(hash_id) == 32  # MD5 is 32 chars
 
+    # IDs must stay stable so re-imported statements are deduplicated
+    assert hash_id == hashlib.md5(b"2023-11-0110.50Test Transaction").hexdigest()
+
     # Test consistency
     assert parsers.generate_hash_id(row) == hash_id
 
 
-def test_get_available_files():
-    mock_files = [
-        Path("fake_dir/n26.csv"),
-        Path("fake_dir/seb.csv"),
-        Path("fake_dir/revolut.csv"),
-        Path("fake_dir/unknown.csv"),
+def test_generate_hash_ids():
+    df = pd.DataFrame(
+        {
+            "date": ["2023-11-01", "2023-11-02"],
+            "amount": ["10.50", "-3.2"],
+            "description": ["Test Transaction", None],
+        },
+        index=[5, 7],
+    )
+    hash_ids = parsers.generate_hash_ids(df)
+
+    assert hash_ids.index.tolist() == [5, 7]
+    assert hash_ids.tolist() == [
+        parsers.generate_hash_id(row) for _, row in df.iterrows()
     ]
+    assert hash_ids[5] == hashlib.md5(b"2023-11-0110.50Test Transaction").hexdigest()
+
+
+def test_get_available_files():
+    mock_entries = []
+    for name in [
+        "n26.csv",
+        "seb.csv",
+        "revolut.csv",
+        "export.csv",
+        "unknown.csv",
+        "notes.txt",
+    ]:
+        entry = MagicMock()
+        entry.name = name
+        entry.path = f"fake_dir/{name}"
+        entry.is_file.return_value = True
+        mock_entries.append(entry)
 
     with (
         patch("src.parsers.Path.exists", return_value=True),
-        patch("src.parsers.Path.glob", return_value=mock_files),
-        patch("src.parsers.identify_bank_type") as mock_identify,
+        patch("src.parsers.os.scandir") as mock_scandir,
+        patch("src.parsers._sniff_bank_type") as mock_sniff,
     ):
-        mock_identify.side_effect = lambda p: (
-            "n26"
-            if "n26" in p.name
-            else "seb"
-            if "seb" in p.name
-            else "revolut"
-            if "revolut" in p.name
-            else "unknown"
+        mock_scandir.return_value.__enter__.return_value = iter(mock_entries)
+        mock_sniff.side_effect = lambda p: (
+            "seb" if p.name == "export.csv" else "unknown"
         )
 
         files = parsers.get_available_files("fake_dir")
@@ -49,10 +75,67 @@ def test_get_available_files():
         assert "n26" in files
         assert Path("fake_dir/n26.csv") in files["n26"]
         assert "seb" in files
-        assert Path("fake_dir/seb.csv") in files["seb"]
+        assert files["seb"] == [Path("fake_dir/seb.csv"), Path("fake_dir/export.csv")]
         assert "revolut" in files
         assert Path("fake_dir/revolut.csv") in files["revolut"]
         assert "unknown" not in files  # Unknown files are logged and skipped
+        # Only .csv files without a bank in their name are read
+        assert [c.args[0].name for c in mock_sniff.call_args_list] == [
+            "export.csv",
+            "unknown.csv",
+        ]
+
+
+def test_identify_bank_type_by_file_name():
+    # Nothing exists on disk, the name alone decides
+    assert parsers.identify_bank_type(Path("missing/N26_2023-11.csv")) == "n26"
+    assert parsers.identify_bank_type(Path("missing/seb-statement.csv")) == "seb"
+    assert parsers.identify_bank_type(Path("missing/Revolut.csv")) == "revolut"
+    assert parsers._BANK_RE.search("sebastian.csv") is None
+
+    with patch("src.parsers._sniff_bank_type", return_value="unknown") as mock_sniff:
+        assert parsers.identify_bank_type(Path("missing/export.csv")) == "unknown"
+    mock_sniff.assert_called_once()
+
+
+def test_get_available_files_caches_bank_type(tmp_path):
+    (tmp_path / "statement.csv").write_text(
+        '"Booking Date","Value Date","Partner Name"\n', encoding="utf-8"
+    )
+
+    (tmp_path / "seb_2023.csv").write_text("", encoding="utf-8")
+
+    with patch(
+        "src.parsers._sniff_bank_type", wraps=parsers._sniff_bank_type
+    ) as mock_sniff:
+        first = parsers.get_available_files(str(tmp_path))
+        second = parsers.get_available_files(str(tmp_path))
+
+    assert first == second
+    assert first["n26"] == [tmp_path / "statement.csv"]
+    assert first["seb"] == [tmp_path / "seb_2023.csv"]
+    # The unchanged file is only read once, the named one never
+    assert mock_sniff.call_count == 1
+    cache = json.loads((tmp_path / parsers.BANK_CACHE_FILE).read_text("utf-8"))
+    assert list(cache) == [str(tmp_path / "statement.csv")]
+
+
+def test_get_available_files_ignores_malformed_cache(tmp_path):
+    statement = tmp_path / "statement.csv"
+    statement.write_text('"Booking Date","Value Date"\n', encoding="utf-8")
+    cache_file = tmp_path / parsers.BANK_CACHE_FILE
+
+    for cache in (
+        [],
+        {str(statement): "n26"},
+        {str(statement): {"size": statement.stat().st_size}},
+    ):
+        cache_file.write_text(json.dumps(cache), encoding="utf-8")
+        assert parsers.get_available_files(str(tmp_path)) == {"n26": [statement]}
+
+    # The bad entry was replaced by a valid one
+    entry = json.loads(cache_file.read_text("utf-8"))[str(statement)]
+    assert entry["bank_type"] == "n26"
 
 
 @patch("pandas.read_csv")
@@ -80,8 +163,11 @@ def test_parse_n26_file(mock_read_csv):
     assert "description" in df.columns
     assert "note" in df.columns
     assert "hash_id" in df.columns
-    assert isinstance(df.iloc[0]["amount"], Decimal)
+    assert df.iloc[0]["amount"] == -1050  # Cents
     assert df.iloc[0]["description"] == "Store A"
+    assert df.iloc[0]["hash_id"] == parsers.generate_hash_id(
+        pd.Series({"date": "2023-11-01", "amount": "-10.50", "description": "Store A"})
+    )
 
 
 @patch("pandas.read_csv")
@@ -112,11 +198,31 @@ def test_parse_seb_file(mock_read_csv):
     mock_read_csv.return_value = pd.DataFrame(data)
 
     df = parsers.parse_seb_file("fake_seb.csv")
-    assert df.iloc[0]["amount"] == Decimal("-5.50")
+    assert df.iloc[0]["amount"] == -550
     assert df.iloc[0]["description"] == "Store B"
     assert "Coffee" in df.iloc[0]["note"]
 
 
+@patch("pandas.read_csv")
+def test_parse_seb_file_debit(mock_read_csv):
+    data = {
+        "DATA": ["2023-11-01", "2023-11-02"],
+        "MOKĖTOJO ARBA GAVĖJO PAVADINIMAS": ["Store B", "Employer"],
+        "MOKĖJIMO PASKIRTIS": ["Coffee", "Salary"],
+        "SUMA SĄSKAITOS VALIUTA": ["5,50", "1000,00"],
+        "VALIUTA": ["EUR", "EUR"],
+        "DEBETAS/KREDITAS": ["D", "K"],
+    }
+    mock_read_csv.return_value = pd.DataFrame(data)
+
+    df = parsers.parse_seb_file("fake_seb.csv")
+    assert df["amount"].tolist() == [-550, 100000]
+    # Debits are hashed with their sign, as written in decimal form
+    assert df.iloc[0]["hash_id"] == parsers.generate_hash_id(
+        pd.Series({"date": "2023-11-01", "amount": "-5.50", "description": "Store B"})
+    )
+
+
 @patch("pandas.read_csv")
 def test_parse_revolut_file(mock_read_csv):
     data = {
@@ -138,4 +244,94 @@ def test_parse_revolut_file(mock_read_csv):
     # Only COMPLETED should be present
     assert len(df) == 1
     assert df.iloc[0]["description"] == "Netflix"
-    assert df.iloc[0]["amount"] == Decimal("-12.99")
+    assert df.iloc[0]["amount"] == -1299
+
+
+def test_parse_files_groups_by_bank_and_skips_failures():
+    def parse_ok(path):
+        return pd.DataFrame({"file": [path.name]})
+
+    def parse_fail(path):
+        raise ValueError("bad file")
+
+    banks_files = {
+        "n26": [Path("a.csv"), Path("b.csv")],
+        "seb": [Path("c.csv")],
+        "unknown": [Path("d.csv")],
+    }
+    with (
+        patch.dict(parsers.PARSERS, {"n26": parse_ok, "seb": parse_fail}),
+        patch("src.parsers.os.cpu_count", return_value=1),
+    ):
+        results = parsers._parse_files(banks_files)
+
+    assert list(results) == ["n26"]
+    assert [df["file"][0] for df in results["n26"]] == ["a.csv", "b.csv"]
+
+
+def test_parse_files_in_process_pool(tmp_path):
+    good = tmp_path / "n26_good.csv"
+    good.write_text(
+        '"Booking Date","Value Date","Partner Name","Partner Iban","Type",'
+        '"Payment Reference","Account Name","Amount (EUR)","Original Amount",'
+        '"Original Currency","Exchange Rate"\n'
+        "2023-11-01,2023-11-01,Store A,IBAN1,Card,Ref,Main,-10.50,,,\n",
+        encoding="utf-8",
+    )
+    bad = tmp_path / "n26_bad.csv"
+    bad.write_text("not,a,statement\n1,2,3\n", encoding="utf-8")
+
+    with (
+        patch.dict(
+            parsers.PARALLEL_MIN_BYTES, dict.fromkeys(parsers.PARALLEL_MIN_BYTES, 0)
+        ),
+        patch("src.parsers.os.cpu_count", return_value=2),
+        patch(
+            "src.parsers.ProcessPoolExecutor", wraps=parsers.ProcessPoolExecutor
+        ) as mock_pool,
+    ):
+        results = parsers._parse_files({"n26": [good, bad]})
+
+    mock_pool.assert_called_once_with(max_workers=2)
+    assert list(results) == ["n26"]
+    assert len(results["n26"]) == 1
+    assert results["n26"][0]["amount"].tolist() == [-1050]
+
+
+def test_parse_files_small_input_skips_process_pool():
+    def parse_ok(path):
+        return pd.DataFrame({"file": [path.name]})
+
+    with (
+        patch.dict(parsers.PARSERS, {"n26": parse_ok}),
+        patch("src.parsers.os.cpu_count", return_value=4),
+        patch("src.parsers.ProcessPoolExecutor") as mock_pool,
+    ):
+        results = parsers._parse_files({"n26": [Path("a.csv"), Path("b.csv")]})
+
+    mock_pool.assert_not_called()
+    assert [df["file"][0] for df in results["n26"]] == ["a.csv", "b.csv"]
+
+
+def test_filter_our_present_data(tmp_path):
+    db_file = str(tmp_path / "test_finance.db")
+    with patch("src.db.DB_PATH", db_file):
+        db.initialize_database(
+            {"categories": {"income": {}, "expense": {}}, "accounts": {"SEB": "Main"}}
+        )
+        stored = pd.DataFrame(
+            {
+                "hash_id": ["old"],
+                "date": ["2023-11-01"],
+                "amount": [100],
+                "description": ["Store"],
+                "note": [""],
+            }
+        )
+        db.load_data("SEB", stored)
+
+        df = pd.DataFrame({"hash_id": ["old", "new", "new"]})
+        filtered = parsers.filter_our_present_data(df)
+    db._connect.cache_clear()
+
+    assert filtered["hash_id"].tolist() == ["new", "new"]
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+import pandera.pandas as pa
+from unittest.mock import patch
+from src.schemas import validate_transactions
+
+
+@pytest.fixture
+def transactions():
+    return pd.DataFrame(
+        {
+            "date": ["2023-11-01"],
+            "amount": [-1050],
+            "description": ["Store A"],
+            "note": ["Ref"],
+            "hash_id": ["abc123"],
+        }
+    )
+
+
+def test_validate_transactions(transactions):
+    assert validate_transactions(transactions) is transactions
+
+
+def test_validate_transactions_extra_column(transactions):
+    transactions["Unnamed: 18"] = ["12"]
+    with pytest.raises(ValueError, match="Expected columns"):
+        validate_transactions(transactions)
+
+
+def test_validate_transactions_non_integer_amount(transactions):
+    transactions["amount"] = ["-10.50"]
+    with pytest.raises(ValueError, match="integer cents"):
+        validate_transactions(transactions)
+
+
+def test_validate_transactions_debug_mode(transactions):
+    transactions["amount"] = ["not a number"]
+    with patch("src.schemas.DEBUG_MODE", True):
+        with pytest.raises((pa.errors.SchemaError, pa.errors.SchemaErrors)):
+            validate_transactions(transactions)
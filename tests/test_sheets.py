@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from unittest.mock import MagicMock, patch
+from gspread.utils import ValueInputOption
+from src import sheets
+
+
+def _transactions() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "hash_id": ["a", "b"],
+            "date": ["2023-11-01", "2023-11-02"],
+            "amount": [-1050, 300000],
+            "description": ["Store A", "Employer"],
+            "note": [np.nan, "Salary"],
+            "category": ["Food", "Salary"],
+            "account": ["SEB", "SEB"],
+        }
+    )
+
+
+@pytest.fixture
+def mock_worksheet():
+    worksheet = MagicMock()
+    client = MagicMock()
+    client.open.return_value.worksheet.return_value = worksheet
+    with patch("src.sheets.get_client", return_value=client):
+        yield worksheet
+
+
+def test_upload_to_sheet_single_range_update(mock_worksheet):
+    mock_worksheet.row_count = 1000
+    mock_worksheet.col_count = 26
+
+    sheets.upload_to_sheet(_transactions(), "My Finances")
+
+    mock_worksheet.clear.assert_called_once()
+    mock_worksheet.resize.assert_not_called()
+    mock_worksheet.update.assert_called_once_with(
+        [
+            ["hash_id", "date", "amount", "description", "note", "category", "account"],
+            ["a", "2023-11-01", -10.5, "Store A", "", "Food", "SEB"],
+            ["b", "2023-11-02", 3000.0, "Employer", "Salary", "Salary", "SEB"],
+        ],
+        "A1:G3",
+        value_input_option=ValueInputOption.user_entered,
+    )
+
+
+def test_upload_to_sheet_grows_small_grid(mock_worksheet):
+    mock_worksheet.row_count = 2
+    mock_worksheet.col_count = 5
+
+    sheets.upload_to_sheet(_transactions(), "My Finances")
+
+    mock_worksheet.resize.assert_called_once_with(rows=3, cols=7)
+    assert mock_worksheet.update.call_args.args[1] == "A1:G3"